@@ -0,0 +1,133 @@
+"""Noyaux numériques (numba) de immoinvest_app.
+
+Module séparé et importé à la première utilisation : l'import de numba
+(~0.5 s) ne pèse pas sur le démarrage de l'interface.
+"""
+import sys
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba absent : les noyaux tournent en Python pur
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+    prange = range
+
+# Le cache disque de numba exige le fichier source : absent d'un exécutable PyInstaller
+NUMBA_CACHE = not getattr(sys, "frozen", False)
+
+@njit(cache=NUMBA_CACHE)
+def amort_kernel(capital, r, m, n):
+    """Récurrence mensuelle du crédit : (interets, principal, crd) en une passe."""
+    interest = np.empty(n, dtype=np.float64)
+    principal = np.empty(n, dtype=np.float64)
+    balance = np.empty(n, dtype=np.float64)
+    crd = capital
+    for i in range(n):
+        it = crd * r
+        pr = max(m - it, 0.0)
+        crd = max(0.0, crd - pr)
+        interest[i] = it
+        principal[i] = pr
+        balance[i] = crd
+    return interest, principal, balance
+
+# En dessous de ce nombre de biens, le noyau série suffit : le lancement des
+# threads coûte plus que le calcul. Seuil prudent, non mesuré sur multi-cœur.
+PARALLEL_MIN_BIENS = 256
+
+@njit(cache=NUMBA_CACHE)
+def _indexation(revalo_loyers, idx_assurance, idx_copro, idx_taxe, idx_assu_empr, idx_autres,
+                n_annees):
+    """Facteurs d'indexation par année (ne dépendent pas du bien)."""
+    f = np.empty((6, n_annees), dtype=np.float64)
+    for y in range(n_annees):
+        f[0, y] = (1 + revalo_loyers) ** y
+        f[1, y] = (1 + idx_assurance) ** y
+        f[2, y] = (1 + idx_copro) ** y
+        f[3, y] = (1 + idx_assu_empr) ** y
+        f[4, y] = (1 + idx_autres) ** y
+        f[5, y] = (1 + idx_taxe) ** y
+    return f
+
+@njit(cache=NUMBA_CACHE)
+def _project_bien(b, loyer, ass, copro, taxe, assu_empr, autres, mensualite, duree, interets,
+                  f, cf, imp):
+    """Remplit les lignes cf[b] et imp[b]."""
+    annuite_pleine = mensualite[b] * 12.0
+    for y in range(f.shape[1]):
+        revenu = (loyer[b] * f[0, y]
+                  - ass[b] * f[1, y]
+                  - copro[b] * f[2, y]
+                  - assu_empr[b] * f[3, y]
+                  - autres[b] * f[4, y]
+                  - taxe[b] * f[5, y])
+        annuite = annuite_pleine if y < duree[b] else 0.0
+        imp[b, y] = revenu - interets[b, y]
+        cf[b, y] = revenu - annuite
+
+@njit(cache=NUMBA_CACHE)
+def _totaux(cf, imp, tmi, taux_ps):
+    """Totaux annuels, impôt et PS sur l'imposable positif, cashflow net."""
+    total_cf = cf.sum(axis=0)
+    total_imp = imp.sum(axis=0)
+    pos = np.maximum(total_imp, 0.0)
+    impots = pos * tmi
+    ps = pos * taux_ps
+    return total_cf, total_imp, impots, ps, total_cf - impots - ps
+
+@njit(cache=NUMBA_CACHE)
+def project_kernel(loyer, ass, copro, taxe, assu_empr, autres, mensualite, duree, interets,
+                   revalo_loyers, idx_assurance, idx_copro, idx_taxe, idx_assu_empr, idx_autres,
+                   tmi, taux_ps, n_annees):
+    """Projection (biens x années) : cashflows, imposable, totaux, impôt, PS."""
+    f = _indexation(revalo_loyers, idx_assurance, idx_copro, idx_taxe, idx_assu_empr, idx_autres,
+                    n_annees)
+    n_biens = loyer.shape[0]
+    cf = np.empty((n_biens, n_annees), dtype=np.float64)
+    imp = np.empty((n_biens, n_annees), dtype=np.float64)
+    for b in range(n_biens):
+        _project_bien(b, loyer, ass, copro, taxe, assu_empr, autres, mensualite, duree, interets,
+                      f, cf, imp)
+    total_cf, total_imp, impots, ps, cf_after_tax = _totaux(cf, imp, tmi, taux_ps)
+    return cf, imp, total_cf, total_imp, impots, ps, cf_after_tax
+
+@njit(cache=NUMBA_CACHE, parallel=True)
+def project_kernel_par(loyer, ass, copro, taxe, assu_empr, autres, mensualite, duree, interets,
+                       revalo_loyers, idx_assurance, idx_copro, idx_taxe, idx_assu_empr, idx_autres,
+                       tmi, taux_ps, n_annees):
+    """project_kernel avec les biens répartis sur les threads (gros portefeuilles)."""
+    f = _indexation(revalo_loyers, idx_assurance, idx_copro, idx_taxe, idx_assu_empr, idx_autres,
+                    n_annees)
+    n_biens = loyer.shape[0]
+    cf = np.empty((n_biens, n_annees), dtype=np.float64)
+    imp = np.empty((n_biens, n_annees), dtype=np.float64)
+    # Biens indépendants : chaque itération n'écrit que sa ligne
+    for b in prange(n_biens):
+        _project_bien(b, loyer, ass, copro, taxe, assu_empr, autres, mensualite, duree, interets,
+                      f, cf, imp)
+    total_cf, total_imp, impots, ps, cf_after_tax = _totaux(cf, imp, tmi, taux_ps)
+    return cf, imp, total_cf, total_imp, impots, ps, cf_after_tax
+
+def project(*args):
+    """Choisit le noyau série ou parallèle selon le nombre de biens."""
+    if args[0].shape[0] >= PARALLEL_MIN_BIENS:
+        return project_kernel_par(*args)
+    return project_kernel(*args)
+
+def warmup():
+    """Compile les noyaux avec les types utilisés par l'application.
+
+    Appelée dans un thread au démarrage : sans cache disque (exécutable
+    PyInstaller), la première compilation prend quelques secondes. Le noyau
+    série passe en premier (cas courant), puis la variante parallèle.
+    """
+    amort_kernel(1000.0, 0.003, 100.0, 12)
+    v = np.ones(1, dtype=np.float64)
+    args = (v, v, v, v, v, v, v, np.ones(1, dtype=np.int32), np.zeros((1, 1)),
+            0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.3, 0.172, 1)
+    project_kernel(*args)
+    project_kernel_par(*args)
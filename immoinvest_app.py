@@ -1,7 +1,7 @@
+import functools
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
 import pandas as pd
 
@@ -11,33 +11,83 @@ import pandas as pd
 
 def mensualite_credit(capital, taux_annuel, duree_annees):
     """Mensualité d’un crédit à annuités constantes (hors assurance)."""
+    return float(mensualite_credit_vec(capital, taux_annuel, duree_annees))
+
+def mensualite_credit_vec(capital, taux_annuel, duree_annees):
+    """Version vectorisée de mensualite_credit (ndarrays de biens en entrée)."""
+    capital = np.asarray(capital, dtype=np.float64)
+    n = np.asarray(duree_annees).astype(np.int64) * 12
+    r = np.asarray(taux_annuel, dtype=np.float64) / 12.0
+    c = (1 + r) ** n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m = np.where(np.abs(r) < 1e-12, capital / np.maximum(n, 1), capital * r / (1 - 1.0 / c))
+    return np.where(n <= 0, 0.0, m)
+
+def _cle_credit(capital, taux_annuel, duree_annees):
+    """Clé de cache commune aux tableaux d'amortissement et aux intérêts annuels.
+
+    Valeurs exactes (non arrondies) : la clé sert aussi d'entrée au calcul.
+    """
+    return float(capital), float(taux_annuel), int(duree_annees)
+
+@functools.lru_cache(maxsize=64)
+def _amortissement(capital, taux_annuel, duree_annees):
+    """(mensualite, interets, principal, crd) mensuels ; ndarrays partagés, ne pas modifier."""
+    from immo_kernels import amort_kernel
+
     n = int(duree_annees) * 12
-    taux_mensuel = float(taux_annuel) / 12.0
-    if n <= 0:
-        return 0.0
-    if abs(taux_mensuel) < 1e-12:
-        return float(capital) / n
-    return float(capital) * (taux_mensuel / (1 - (1 + taux_mensuel) ** -n))
+    m = mensualite_credit(capital, taux_annuel, duree_annees)
+    interest, principal, balance = amort_kernel(float(capital), float(taux_annuel) / 12.0, m, n)
+    return m, interest, principal, balance
 
 def tableau_amortissement(capital, taux_annuel, duree_annees):
-    """Retourne un DataFrame mensuel: mois, annee, mensualite, interets, principal, crd."""
+    """Retourne un DataFrame mensuel: mois, annee, mensualite, interets, principal, crd.
+
+    Le tableau est partagé entre les biens de même crédit : ne pas le modifier.
+    """
+    return _tableau_amortissement(*_cle_credit(capital, taux_annuel, duree_annees))
+
+@functools.lru_cache(maxsize=64)
+def _tableau_amortissement(capital, taux_annuel, duree_annees):
     n = int(duree_annees) * 12
     if n <= 0:
         return pd.DataFrame(columns=["month_index","year","month","payment","interest","principal","balance"])
-    r = float(taux_annuel) / 12.0
-    m = mensualite_credit(capital, taux_annuel, duree_annees)
-    rows = []
-    balance = float(capital)
-    for i in range(1, n+1):
-        interest = balance * r
-        principal = max(m - interest, 0.0)
-        balance = max(0.0, balance - principal)
-        year = (i - 1) // 12 + 1
-        month = (i - 1) % 12 + 1
-        rows.append([i, year, month, m, interest, principal, balance])
-    df = pd.DataFrame(rows, columns=["month_index","year","month","payment","interest","principal","balance"])
+    m, interest, principal, balance = _amortissement(capital, taux_annuel, duree_annees)
+    i = np.arange(1, n + 1)
+    df = pd.DataFrame({
+        "month_index": i,
+        "year": (i - 1) // 12 + 1,
+        "month": (i - 1) % 12 + 1,
+        "payment": np.full(n, m),
+        "interest": interest,
+        "principal": principal,
+        "balance": balance,
+    })
     return df
 
+def echeancier_annuel(capital, taux_annuel, duree_annees):
+    """(mensualite, interets par année) d'un crédit, tirés du même échéancier.
+
+    Mêmes données que tableau_amortissement, sans construire le DataFrame.
+    """
+    capital, taux_annuel, duree_annees = _cle_credit(capital, taux_annuel, duree_annees)
+    if duree_annees <= 0:
+        return mensualite_credit(capital, taux_annuel, duree_annees), np.zeros(0)
+    m, interest, _, _ = _amortissement(capital, taux_annuel, duree_annees)
+    return m, np.bincount(np.arange(duree_annees * 12) // 12, weights=interest, minlength=duree_annees)
+
+def _libelles_uniques(noms):
+    """Libellés distincts pour des noms répétés : "Appart", "Appart (2)", ..."""
+    vus = set()
+    libelles = []
+    for nom in noms:
+        lib, i = nom, 2
+        while lib in vus:
+            lib, i = f"{nom} ({i})", i + 1
+        vus.add(lib)
+        libelles.append(lib)
+    return libelles
+
 # -----------------------------
 # Hypothèses (scénarios A/B)
 # -----------------------------
@@ -72,6 +122,10 @@ class HypScenario:
             "duree_projection": self.duree_projection,
         }
 
+    def as_dict_tuple(self):
+        """Version hashable de as_dict() (clé de cache des projections)."""
+        return tuple(self.as_dict().items())
+
 # -----------------------------
 # Application
 # -----------------------------
@@ -83,6 +137,8 @@ class ImmoApp(tk.Tk):
         self.geometry("1440x900")
 
         self.biens = []  # liste de dicts
+        self.biens_arr = None  # vue colonnes de self.biens, reconstruite à la demande
+        self._proj_cache: dict[tuple, dict] = {}  # projections déjà calculées
         self.hypA = HypScenario("A")
         self.hypB = HypScenario("B")
         self.current_scenario = tk.StringVar(value="A")
@@ -110,6 +166,13 @@ class ImmoApp(tk.Tk):
             self.tree_biens.column(col, width=160, anchor="center")
         self.tree_biens.pack(fill="x", padx=10, pady=6)
 
+        # Compilation des noyaux numba en arrière-plan, hors du thread Tk
+        threading.Thread(target=self._warm_kernels, daemon=True).start()
+
+    def _warm_kernels(self):
+        import immo_kernels
+        immo_kernels.warmup()
+
     # -------- Hypothèses --------
 
     def edit_hypotheses(self, which="A"):
@@ -149,6 +212,7 @@ class ImmoApp(tk.Tk):
                 hyp.tmi             = float(entries["tmi"].get())/100.0
                 hyp.ps              = float(entries["ps"].get())/100.0
                 hyp.duree_projection= int(float(entries["duree_projection"].get()))
+                self._proj_cache.clear()
                 messagebox.showinfo("OK", f"Hypothèses {which} mises à jour.")
                 win.destroy()
             except Exception as e:
@@ -201,10 +265,12 @@ class ImmoApp(tk.Tk):
                         "autres": float(entries["autres"].get() or 0),
                     }
                 }
-                bien["mensualite"] = mensualite_credit(bien["emprunt"], bien["taux"], bien["duree"])
-                bien["amort"] = tableau_amortissement(bien["emprunt"], bien["taux"], bien["duree"])
+                bien["mensualite"], bien["interest_per_year"] = echeancier_annuel(
+                    bien["emprunt"], bien["taux"], bien["duree"])
                 self.biens.append(bien)
-                self.refresh_biens_list()
+                self.biens_arr = None
+                self._proj_cache.clear()
+                self._append_bien_to_tree(bien)
                 self.status.config(text=f"{bien['nom']} ajouté.")
                 win.destroy()
             except Exception as e:
@@ -212,14 +278,35 @@ class ImmoApp(tk.Tk):
 
         ttk.Button(win, text="Enregistrer le bien", command=save).grid(row=len(labels), column=0, columnspan=2, pady=12)
 
+    def _rebuild_biens_arr(self):
+        """Vue colonnes (un ndarray par champ) de self.biens pour la projection."""
+        biens = self.biens
+
+        def charge(key):
+            return np.array([b["charges"].get(key, 0.0) for b in biens], dtype=np.float64)
+
+        self.biens_arr = {
+            "loyer": np.array([b["loyer"] for b in biens], dtype=np.float64),
+            "ass": charge("assurance"),
+            "copro": charge("copro"),
+            "taxe": charge("taxe_fonciere"),
+            "assu_empr": charge("assurance_emprunteur"),
+            "autres": charge("autres"),
+            "mensualite": np.array([b["mensualite"] for b in biens], dtype=np.float64),
+            "duree": np.array([b["duree"] for b in biens], dtype=np.int32),
+        }
+
     def refresh_biens_list(self):
         for it in self.tree_biens.get_children():
             self.tree_biens.delete(it)
         for b in self.biens:
-            self.tree_biens.insert("", "end", values=(
-                b["nom"], f"{b['emprunt']:.0f}", b["duree"], f"{b['taux']*100:.2f}%",
-                f"{b['loyer']:.0f}", f"{b['mensualite']:.2f}"
-            ))
+            self._append_bien_to_tree(b)
+
+    def _append_bien_to_tree(self, b):
+        self.tree_biens.insert("", "end", values=(
+            b["nom"], f"{b['emprunt']:.0f}", b["duree"], f"{b['taux']*100:.2f}%",
+            f"{b['loyer']:.0f}", f"{b['mensualite']:.2f}"
+        ))
 
     # -------- Amortissement --------
 
@@ -248,8 +335,8 @@ class ImmoApp(tk.Tk):
         ttk.Button(win, text="Afficher", command=open_for).pack(pady=10)
 
     def show_amortissement(self, bien):
-        df = bien.get("amort")
-        if df is None or df.empty:
+        df = tableau_amortissement(bien["emprunt"], bien["taux"], bien["duree"])
+        if df.empty:
             messagebox.showerror("Erreur", "Pas de données d'amortissement.")
             return
         win = tk.Toplevel(self)
@@ -267,12 +354,12 @@ class ImmoApp(tk.Tk):
             tree.column(c, anchor="center", width=140)
         tree.pack(fill="both", expand=True, padx=10, pady=10)
 
-        for _, row in df.iterrows():
-            tree.insert("", "end", values=(
-                int(row["year"]), int(row["month"]),
-                round(row["payment"],2), round(row["interest"],2),
-                round(row["principal"],2), round(row["balance"],2)
-            ))
+        # Lignes pré-formatées depuis le ndarray (évite iterrows et ses Series)
+        arr = df[cols].to_numpy(dtype=float)
+        rows = [("%d" % r[0], "%d" % r[1], "%.2f" % r[2], "%.2f" % r[3], "%.2f" % r[4], "%.2f" % r[5])
+                for r in arr]
+        for values in rows:
+            tree.insert("", "end", values=values)
 
         def export_df():
             path = filedialog.asksaveasfilename(defaultextension=".xlsx",
@@ -288,57 +375,40 @@ class ImmoApp(tk.Tk):
 
     # -------- Projection / Synthèse --------
 
+    def _proj_key(self, hyp):
+        return (id(hyp), hyp.as_dict_tuple(),
+                tuple((b["nom"], b["emprunt"], b["taux"], b["duree"], b["loyer"],
+                       tuple(b["charges"].items())) for b in self.biens))
+
     def _project_with_scenario(self, hyp):
-        annees = list(range(1, int(hyp.duree_projection) + 1))
-        resultats_cashflow = {b["nom"]: [] for b in self.biens}
-        resultats_imposable = {b["nom"]: [] for b in self.biens}
-        total_cashflow = np.zeros(len(annees))
-        total_imposable = np.zeros(len(annees))
+        key = self._proj_key(hyp)
+        res = self._proj_cache.get(key)
+        if res is not None:
+            return res
 
-        for b in self.biens:
-            df_am = b["amort"]
-            interets_par_an = df_am.groupby("year")["interest"].sum().to_dict() if df_am is not None else {}
-
-            # bases (année 1)
-            loy_base = b["loyer"]
-            ass_base = b["charges"].get("assurance", 0.0)
-            copro_base = b["charges"].get("copro", 0.0)
-            taxe_base = b["charges"].get("taxe_fonciere", 0.0)
-            assu_empr_base = b["charges"].get("assurance_emprunteur", 0.0)
-            autres_base = b["charges"].get("autres", 0.0)
-
-            mensualite_annuelle = b["mensualite"] * 12.0
-
-            for year in annees:
-                # Indexations distinctes
-                loy = loy_base * ((1 + hyp.revalo_loyers) ** (year - 1))
-                ass = ass_base * ((1 + hyp.idx_assurance) ** (year - 1))
-                copro = copro_base * ((1 + hyp.idx_copro) ** (year - 1))
-                taxe = taxe_base * ((1 + hyp.idx_taxe) ** (year - 1))
-                assu_empr = assu_empr_base * ((1 + hyp.idx_assu_empr) ** (year - 1))
-                autres = autres_base * ((1 + hyp.idx_autres) ** (year - 1))
-                charges_tot = ass + copro + assu_empr + autres
-
-                annuite = mensualite_annuelle if year <= b["duree"] else 0.0
-                interets = interets_par_an.get(year, 0.0) if year <= b["duree"] else 0.0
-
-                revenu_imposable = loy - charges_tot - taxe - interets
-                resultats_imposable[b["nom"]].append(revenu_imposable)
-
-                cashflow = loy - charges_tot - taxe - annuite
-                resultats_cashflow[b["nom"]].append(cashflow)
-
-        # Agrégations
-        for i,_ in enumerate(annees):
-            total_cashflow[i] = sum(resultats_cashflow[b["nom"]][i] for b in self.biens)
-            total_imposable[i] = sum(resultats_imposable[b["nom"]][i] for b in self.biens)
-
-        # Impôts & PS sur le total imposable positif
-        impots = np.array([max(total_imposable[i], 0)*hyp.tmi for i in range(len(annees))])
-        ps = np.array([max(total_imposable[i], 0)*hyp.ps for i in range(len(annees))])
-        cf_after_tax = total_cashflow - impots - ps
+        from immo_kernels import project
 
-        return {
+        annees = list(range(1, int(hyp.duree_projection) + 1))
+        n_annees = len(annees)
+        if self.biens_arr is None:
+            self._rebuild_biens_arr()
+        arr = self.biens_arr
+
+        # Intérêts annuels : une ligne par bien
+        interets = np.zeros((len(self.biens), n_annees))
+        for k, b in enumerate(self.biens):
+            ipy = b["interest_per_year"][:n_annees]
+            interets[k, :len(ipy)] = ipy
+
+        (resultats_cashflow, resultats_imposable, total_cashflow, total_imposable,
+         impots, ps, cf_after_tax) = project(
+            arr["loyer"], arr["ass"], arr["copro"], arr["taxe"], arr["assu_empr"], arr["autres"],
+            arr["mensualite"], arr["duree"], interets,
+            float(hyp.revalo_loyers), float(hyp.idx_assurance), float(hyp.idx_copro),
+            float(hyp.idx_taxe), float(hyp.idx_assu_empr), float(hyp.idx_autres),
+            float(hyp.tmi), float(hyp.ps), n_annees)
+
+        res = {
             "annees": annees,
             "resultats_cashflow": resultats_cashflow,
             "resultats_imposable": resultats_imposable,
@@ -348,6 +418,28 @@ class ImmoApp(tk.Tk):
             "ps": ps,
             "cf_after_tax": cf_after_tax,
         }
+        self._proj_cache[key] = res
+        return res
+
+    def _synthese_data(self, res, hyp):
+        """Colonnes de la synthèse (nom -> ndarray typé), dans l'ordre du tableau."""
+        # Deux biens peuvent porter le même nom : une colonne chacun malgré tout
+        noms = _libelles_uniques([b["nom"] for b in self.biens])
+        data = {"Année": np.asarray(res["annees"], dtype=np.int32)}
+        for k, nom in enumerate(noms):
+            data[f"CF {nom}"] = res["resultats_cashflow"][k]
+        data[f"TOTAL CF ({hyp.name})"] = res["total_cashflow"]
+        for k, nom in enumerate(noms):
+            data[f"IMP {nom}"] = res["resultats_imposable"][k]
+        data[f"TOTAL IMP ({hyp.name})"] = res["total_imposable"]
+        data[f"Impôt (TMI) {hyp.name}"] = res["impots"]
+        data[f"PS {hyp.name}"] = res["ps"]
+        data[f"CF après impôt+PS {hyp.name}"] = res["cf_after_tax"]
+        return data
+
+    def _synthese_frame(self, data):
+        """DataFrame d'export (CSV/Excel) construit depuis _synthese_data, arrondi à 2 décimales."""
+        return pd.DataFrame(data).round(2)
 
     def show_projection(self):
         if not self.biens:
@@ -362,12 +454,22 @@ class ImmoApp(tk.Tk):
         win.title(f"Synthèse — Scénario {self.current_scenario.get()}")
         win.geometry("1500x900")
 
-        # Graphique combiné
-        fig, ax = plt.subplots(figsize=(9.5, 6.0))
+        # Graphique combiné (matplotlib importé à la demande, hors pyplot)
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        fig = Figure(figsize=(9.5, 6.0))
+        ax = fig.add_subplot(111)
+
+        def on_close():
+            fig.clf()
+            win.destroy()
+
+        win.protocol("WM_DELETE_WINDOW", on_close)
 
         # Courbes par bien (Cashflow)
-        for b in self.biens:
-            ax.plot(res_sel["annees"], res_sel["resultats_cashflow"][b["nom"]], label=f"CF {b['nom']}")
+        for k, nom in enumerate(_libelles_uniques([b["nom"] for b in self.biens])):
+            ax.plot(res_sel["annees"], res_sel["resultats_cashflow"][k], label=f"CF {nom}")
 
         # Totaux scénario sélectionné
         ax.plot(res_sel["annees"], res_sel["total_cashflow"], label=f"TOTAL CF ({self.current_scenario.get()})", linewidth=3, linestyle="--")
@@ -394,10 +496,8 @@ class ImmoApp(tk.Tk):
         right = ttk.Frame(win)
         right.pack(side="right", fill="both", expand=True, padx=8, pady=8)
 
-        colonnes = (["Année"] +
-                    [f"CF {b['nom']}" for b in self.biens] + [f"TOTAL CF ({hyp_sel.name})"] +
-                    [f"IMP {b['nom']}" for b in self.biens] + [f"TOTAL IMP ({hyp_sel.name})"] +
-                    [f"Impôt (TMI) {hyp_sel.name}", f"PS {hyp_sel.name}", f"CF après impôt+PS {hyp_sel.name}"])
+        data_sel = self._synthese_data(res_sel, hyp_sel)
+        colonnes = list(data_sel)
 
         tree = ttk.Treeview(right, columns=colonnes, show="headings", height=27)
         for c in colonnes:
@@ -405,25 +505,10 @@ class ImmoApp(tk.Tk):
             tree.column(c, anchor="center", width=140)
         tree.pack(fill="both", expand=True)
 
-        df_rows = []
-        for i, an in enumerate(res_sel["annees"]):
-            row = [an]
-            # CF par bien
-            for b in self.biens:
-                row.append(round(res_sel["resultats_cashflow"][b["nom"]][i], 2))
-            row.append(round(res_sel["total_cashflow"][i], 2))
-            # Revenu imposable par bien
-            for b in self.biens:
-                row.append(round(res_sel["resultats_imposable"][b["nom"]][i], 2))
-            row.append(round(res_sel["total_imposable"][i], 2))
-            # Impôt + PS + CF net
-            row.extend([
-                round(res_sel["impots"][i], 2),
-                round(res_sel["ps"][i], 2),
-                round(res_sel["cf_after_tax"][i], 2)
-            ])
-            df_rows.append(row)
-            tree.insert("", "end", values=row)
+        # Toutes les lignes arrondies d'un coup, puis insertion
+        table = np.column_stack(list(data_sel.values())).round(2)
+        for r in table.tolist():
+            tree.insert("", "end", values=[int(r[0])] + r[1:])
 
         # Export (inclut les deux scénarios + amortissements)
         def export_synthese():
@@ -432,37 +517,18 @@ class ImmoApp(tk.Tk):
             if not path: return
 
             if path.lower().endswith(".csv"):
-                import pandas as pd
-                df = pd.DataFrame(df_rows, columns=colonnes)
-                df.to_csv(path, index=False, encoding="utf-8-sig")
+                self._synthese_frame(data_sel).to_csv(path, index=False, encoding="utf-8-sig")
             else:
-                with pd.ExcelWriter(path, engine="openpyxl") as writer:
+                with pd.ExcelWriter(path, engine="xlsxwriter") as writer:
                     # Synthèse scénario sélectionné
-                    pd.DataFrame(df_rows, columns=colonnes).to_excel(writer, sheet_name=f"Synthese_{hyp_sel.name}", index=False)
+                    self._synthese_frame(data_sel).to_excel(
+                        writer, sheet_name=f"Synthese_{hyp_sel.name}", index=False)
 
                     # Ajout synthèse de l'autre scénario pour comparaison
                     other = self.hypB if hyp_sel is self.hypA else self.hypA
                     res_other = self._project_with_scenario(other)
-                    colonnes_other = (["Année"] +
-                                      [f"CF {b['nom']}" for b in self.biens] + [f"TOTAL CF ({other.name})"] +
-                                      [f"IMP {b['nom']}" for b in self.biens] + [f"TOTAL IMP ({other.name})"] +
-                                      [f"Impôt (TMI) {other.name}", f"PS {other.name}", f"CF après impôt+PS {other.name}"])
-                    rows_other = []
-                    for i, an in enumerate(res_other["annees"]):
-                        r = [an]
-                        for b in self.biens:
-                            r.append(round(res_other["resultats_cashflow"][b["nom"]][i], 2))
-                        r.append(round(res_other["total_cashflow"][i], 2))
-                        for b in self.biens:
-                            r.append(round(res_other["resultats_imposable"][b["nom"]][i], 2))
-                        r.append(round(res_other["total_imposable"][i], 2))
-                        r.extend([
-                            round(res_other["impots"][i], 2),
-                            round(res_other["ps"][i], 2),
-                            round(res_other["cf_after_tax"][i], 2)
-                        ])
-                        rows_other.append(r)
-                    pd.DataFrame(rows_other, columns=colonnes_other).to_excel(writer, sheet_name=f"Synthese_{other.name}", index=False)
+                    self._synthese_frame(self._synthese_data(res_other, other)).to_excel(
+                        writer, sheet_name=f"Synthese_{other.name}", index=False)
 
                     # Onglet Hypothèses
                     hyp_df = pd.DataFrame([
@@ -472,10 +538,11 @@ class ImmoApp(tk.Tk):
                     hyp_df.to_excel(writer, sheet_name="Hypotheses", index=False)
 
                     # Amortissements
-                    for b in self.biens:
-                        am = b.get("amort")
-                        if am is not None and not am.empty:
-                            am.to_excel(writer, sheet_name=f"Amort_{b['nom'][:20]}", index=False)
+                    onglets = _libelles_uniques([b["nom"][:20] for b in self.biens])
+                    for b, onglet in zip(self.biens, onglets):
+                        am = tableau_amortissement(b["emprunt"], b["taux"], b["duree"])
+                        if not am.empty:
+                            am.to_excel(writer, sheet_name=f"Amort_{onglet}", index=False)
 
             messagebox.showinfo("Export", f"Fichier sauvegardé :\n{path}")
 